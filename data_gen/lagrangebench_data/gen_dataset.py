@@ -3,11 +3,12 @@
 import argparse
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 import h5py
 import numpy as np
 from jax import vmap
-from jax_sph.io_state import read_h5, write_h5
+from jax_sph.io_state import write_h5
 from jax_sph.jax_md import space
 from omegaconf import OmegaConf
 
@@ -19,6 +20,95 @@ def write_h5_frame_for_visualization(state_dict, file_path_h5):
     print("done")
 
 
+def read_h5_frame(file_path_h5):
+    """Read only positions and tags from a jax-sph .h5 frame file.
+
+    Unlike jax_sph.io_state.read_h5, this avoids loading the full state dict
+    (velocities, densities, etc.) when only "r" and "tag" are needed.
+    """
+    with h5py.File(file_path_h5, "r") as hf:
+        r = hf["r"][:]
+        tag = hf["tag"][:]
+    return r, tag
+
+
+def storage_kwargs(compression, shape):
+    """Map the --compression choice to h5py.create_dataset storage kwargs.
+
+    "bitshuffle" (bitshuffle+LZ4 via hdf5plugin) decompresses much faster than
+    gzip at a similar ratio, but needs the optional hdf5plugin package both for
+    writing and reading.
+
+    Compressed datasets are chunked by single time step, matching the
+    H5Dataset.get_window access pattern. Uncompressed datasets are stored
+    contiguously (no chunks) so that H5Dataset can memory-map them directly.
+    """
+    if compression == "none":
+        return {}
+    # chunk by single time step of shape (1, particles, dim)
+    chunks = {"chunks": (1, *shape[1:])}
+    if compression == "bitshuffle":
+        import hdf5plugin
+
+        return {**chunks, **dict(hdf5plugin.Bitshuffle())}
+    else:  # gzip, lzf
+        return {**chunks, "compression": compression}
+
+
+def outer_walls_mask(r, tag, L, H, dx):
+    """Boolean mask which is False on the outer wall layers of an L x H box.
+
+    The predicates are combined with fused boolean ops, i.e. without the
+    intermediate np.where(..., False, True) arrays of the previous version.
+    """
+    is_wall = tag == 1
+    drop = np.logical_or.reduce(
+        [
+            r[:, 1] < 2 * dx,
+            r[:, 1] > H + 4 * dx,
+            (r[:, 0] < 2 * dx) & is_wall,
+            (r[:, 0] > L + 4 * dx) & is_wall,
+        ]
+    )
+    return ~drop
+
+
+def _load_trajectory(
+    traj_path, skip_first_n_frames, slice_every_nth_frame, wall_size, is_visualize
+):
+    """Read one trajectory directory into a (time steps, particles, dim) array.
+
+    Module-level so it can be dispatched to ProcessPoolExecutor workers.
+    """
+    files = os.listdir(traj_path)
+    files = [f for f in files if (".h5" in f)]
+    files = sorted(files, key=lambda x: int(x.split("_")[1][:-3]))
+    files = files[skip_first_n_frames::slice_every_nth_frame]
+
+    position = None
+    for k, filename in enumerate(files):
+        file_path_h5 = os.path.join(traj_path, filename)
+        r, tag = read_h5_frame(file_path_h5)
+
+        if wall_size is not None:  # remove outer walls
+            L, H = wall_size
+            cfg = OmegaConf.load(os.path.join(traj_path, "config.yaml"))
+            mask = outer_walls_mask(r, tag, L, H, cfg.case.dx)
+
+            r = r[mask]
+            tag = tag[mask]
+
+        if is_visualize:
+            write_h5_frame_for_visualization({"r": r, "tag": tag}, file_path_h5)
+        if position is None:
+            # (time steps, particles, dim) buffer, already in the
+            # output dtype. Every slot is overwritten -> np.empty.
+            position = np.empty((len(files), *r.shape), dtype=np.float32)
+        position[k] = r
+
+    return position, tag
+
+
 def single_h5_files_to_h5_dataset(args):
     """Transform a set of .h5 files to a single .h5 dataset file
 
@@ -70,36 +160,32 @@ def single_h5_files_to_h5_dataset(args):
         hf = h5py.File(os.path.join(args.dst_dir, f"{split}.h5"), "w")
 
         if len(dirs) == 1:  # one long trajectory
-            position = []
+            position = None
             traj_path = os.path.join(args.src_dir, dirs[0])
+            split_files = files[splits_trajs[i] : splits_trajs[i + 1]]
 
-            for j, filename in enumerate(files[splits_trajs[i] : splits_trajs[i + 1]]):
+            for j, filename in enumerate(split_files):
                 file_path_h5 = os.path.join(traj_path, filename)
-                state = read_h5(file_path_h5, array_type="numpy")
-                r = state["r"]
-                tag = state["tag"]
+                r, tag = read_h5_frame(file_path_h5)
 
                 if "ldc" in args.src_dir.lower():  # remove outer walls in lid-driven
                     L, H = 1.0, 1.0
                     cfg = OmegaConf.load(os.path.join(traj_path, "config.yaml"))
-                    mask_bottom = np.where(r[:, 1] < 2 * cfg.case.dx, False, True)
-                    mask_lid = np.where(r[:, 1] > H + 4 * cfg.case.dx, False, True)
-                    mask_left = np.where(
-                        ((r[:, 0] < 2 * cfg.case.dx) * (tag == 1)), False, True
-                    )
-                    mask_right = np.where(
-                        (r[:, 0] > L + 4 * cfg.case.dx) * (tag == 1), False, True
-                    )
-                    mask = mask_bottom * mask_lid * mask_left * mask_right
+                    mask = outer_walls_mask(r, tag, L, H, cfg.case.dx)
 
                     r = r[mask]
                     tag = tag[mask]
 
                 if args.is_visualize:
                     write_h5_frame_for_visualization({"r": r, "tag": tag}, file_path_h5)
-                position.append(r)
+                if position is None:
+                    # (time steps, particles, dim) buffer, already in the output
+                    # dtype. Every slot is overwritten, so np.empty is safe.
+                    position = np.empty(
+                        (len(split_files), *r.shape), dtype=np.float32
+                    )
+                position[j] = r
 
-            position = np.stack(position)  # (time steps, particles, dim)
             particle_type = tag  # (particles,)
 
             traj_str = "00000"
@@ -108,56 +194,41 @@ def single_h5_files_to_h5_dataset(args):
                 f"{traj_str}/position",
                 data=position,
                 dtype=np.float32,
-                compression="gzip",
+                **storage_kwargs(args.compression, position.shape),
             )
 
         else:  # multiple trajectories
-            for j, dir in enumerate(dirs[splits_trajs[i] : splits_trajs[i + 1]]):
-                traj_path = os.path.join(args.src_dir, dir)
-                files = os.listdir(traj_path)
-                files = [f for f in files if (".h5" in f)]
-                files = sorted(files, key=lambda x: int(x.split("_")[1][:-3]))
-                files = files[args.skip_first_n_frames :: args.slice_every_nth_frame]
-
-                position = []
-                for k, filename in enumerate(files):
-                    file_path_h5 = os.path.join(traj_path, filename)
-                    state = read_h5(file_path_h5, array_type="numpy")
-                    r = state["r"]
-                    tag = state["tag"]
-
-                    if "db" in args.src_dir.lower():  # remove outer walls in dam break
-                        L, H = 5.366, 2.0
-                        cfg = OmegaConf.load(os.path.join(traj_path, "config.yaml"))
-                        mask_bottom = np.where(r[:, 1] < 2 * cfg.sase.dx, False, True)
-                        mask_lid = np.where(r[:, 1] > H + 4 * cfg.case.dx, False, True)
-                        mask_left = np.where(
-                            ((r[:, 0] < 2 * cfg.case.dx) * (tag == 1)), False, True
-                        )
-                        mask_right = np.where(
-                            (r[:, 0] > L + 4 * cfg.case.dx) * (tag == 1), False, True
-                        )
-                        mask = mask_bottom * mask_lid * mask_left * mask_right
-
-                        r = r[mask]
-                        tag = tag[mask]
-
-                    if args.is_visualize:
-                        write_h5_frame_for_visualization(
-                            {"r": r, "tag": tag}, file_path_h5
-                        )
-                    position.append(r)
-                position = np.stack(position)  # (time steps, particles, dim)
-                particle_type = tag  # (particles,)
-
-                traj_str = str(j).zfill(5)
-                hf.create_dataset(f"{traj_str}/particle_type", data=particle_type)
-                hf.create_dataset(
-                    f"{traj_str}/position",
-                    data=position,
-                    dtype=np.float32,
-                    compression="gzip",
-                )
+            # dam break: remove outer walls
+            wall_size = (5.366, 2.0) if "db" in args.src_dir.lower() else None
+            split_dirs = dirs[splits_trajs[i] : splits_trajs[i + 1]]
+
+            # trajectories are independent, so read+mask them in worker
+            # processes. Only this (single) process writes to the output file.
+            with ProcessPoolExecutor(max_workers=args.num_workers) as pool:
+                futures = [
+                    pool.submit(
+                        _load_trajectory,
+                        os.path.join(args.src_dir, dir),
+                        args.skip_first_n_frames,
+                        args.slice_every_nth_frame,
+                        wall_size,
+                        args.is_visualize,
+                    )
+                    for dir in split_dirs
+                ]
+
+                for j, (dir, future) in enumerate(zip(split_dirs, futures)):
+                    traj_path = os.path.join(args.src_dir, dir)
+                    position, particle_type = future.result()
+
+                    traj_str = str(j).zfill(5)
+                    hf.create_dataset(f"{traj_str}/particle_type", data=particle_type)
+                    hf.create_dataset(
+                        f"{traj_str}/position",
+                        data=position,
+                        dtype=np.float32,
+                        **storage_kwargs(args.compression, position.shape),
+                    )
 
         hf.close()
         print(f"Finished {args.src_dir} {split} with {j+1} entries!")
@@ -272,7 +343,14 @@ if __name__ == "__main__":
     parser.add_argument("--split", type=str, help="E.g. 3_1_1")
     parser.add_argument("--skip_first_n_frames", type=int, default=0)
     parser.add_argument("--slice_every_nth_frame", type=int, default=1)
+    parser.add_argument(
+        "--compression",
+        type=str,
+        default="gzip",
+        choices=["gzip", "lzf", "bitshuffle", "none"],
+    )
     parser.add_argument("--is_visualize", action="store_true")
+    parser.add_argument("--num_workers", type=int, default=os.cpu_count())
     args = parser.parse_args()
 
     single_h5_files_to_h5_dataset(args)
@@ -4,6 +4,7 @@ import warnings
 from typing import Callable, Dict, Optional, Tuple, Union
 
 import jax.numpy as jnp
+import numpy as np
 from jax import Array, jit, lax, vmap
 from jax_sph.jax_md import space
 from jax_sph.jax_md.dataclasses import dataclass, static_field
@@ -101,8 +102,9 @@ def case_builder(
         metadata, cfg_model.isotropic_norm, noise_std
     )
 
-    # apply PBC in all directions or not at all
-    if jnp.array(metadata["periodic_boundary_conditions"]).any():
+    # apply PBC in all directions or not at all. This is a static host-side
+    # decision, so only the chosen branch is ever traced.
+    if np.array(metadata["periodic_boundary_conditions"]).any():
         displacement_fn, shift_fn = space.periodic(side=jnp.array(box))
     else:
         displacement_fn, shift_fn = space.free()
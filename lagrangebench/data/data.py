@@ -1,6 +1,5 @@
 """Dataset modules for loading HDF5 simulation trajectories."""
 
-import bisect
 import importlib
 import json
 import os
@@ -8,14 +7,22 @@ import os.path as osp
 import re
 import warnings
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 import h5py
-import jax.numpy as jnp
 import numpy as np
 import wget
 from torch.utils.data import Dataset
 
+try:
+    # registers the bitshuffle+LZ4 filter with HDF5 on import, needed to read
+    # datasets packed with `gen_dataset.py --compression bitshuffle`. The
+    # default gzip datasets work without it.
+    import hdf5plugin  # noqa: F401
+except ImportError:
+    hdf5plugin = None
+
 from lagrangebench.utils import NodeType
 
 ZENODO_PREFIX = "https://zenodo.org/records/10491868/files/"
@@ -105,6 +112,14 @@ class H5Dataset(Dataset):
             self.metadata = json.loads(f.read())
 
         self.db_hdf5 = None
+        self._position_datasets = None
+        self._position_memmaps = None
+        self._particle_types = None
+        # pid that opened db_hdf5, see _open_hdf5
+        self._h5_pid = None
+        # background reader for get_trajectory, see docstring there
+        self._prefetcher = None
+        self._prefetched = None
 
         with h5py.File(self.file_path, "r") as f:
             self.traj_keys = list(f.keys())
@@ -119,12 +134,11 @@ class H5Dataset(Dataset):
             # from the end of a trajectory. Thus, the number of training samples per
             # trajectory becomes:
             self.subseq_length = input_seq_length + 1 + extra_seq_length
-            samples_per_traj = self.sequence_length - self.subseq_length + 1
-
-            keylens = jnp.array([samples_per_traj for _ in range(len(self.traj_keys))])
-            self._keylen_cumulative = jnp.cumsum(keylens).tolist()
+            # all trajectories have the same length, so mapping a flat sample
+            # index to (trajectory, offset) is a plain divmod in get_window
+            self._samples_per_traj = self.sequence_length - self.subseq_length + 1
 
-            self.num_samples = sum(keylens)
+            self.num_samples = self._samples_per_traj * len(self.traj_keys)
             self.getter = self.get_window
 
         else:
@@ -175,10 +189,84 @@ class H5Dataset(Dataset):
         return path
 
     def _open_hdf5(self) -> h5py.File:
+        if self.db_hdf5 is not None and self._h5_pid != os.getpid():
+            # dataloader workers are forked and must not share the parent's
+            # HDF5 handle (h5py is not fork-safe and a shared handle would
+            # serialize reads). Drop the inherited state so every process,
+            # including each persistent worker, opens its own file.
+            self.db_hdf5 = None
+            self._prefetcher = None
+            self._prefetched = None
         if self.db_hdf5 is None:
-            return h5py.File(self.file_path, "r")
-        else:
-            return self.db_hdf5
+            # larger chunk cache so consecutive windows hit decompressed chunks
+            cache_kwargs = {
+                "rdcc_nbytes": 64 * 1024 * 1024,
+                "rdcc_nslots": 100003,
+                "rdcc_w0": 0.75,
+            }
+            try:
+                # SWMR avoids file locking between concurrent readers
+                self.db_hdf5 = h5py.File(
+                    self.file_path, "r", libver="latest", swmr=True, **cache_kwargs
+                )
+            except OSError:
+                # files written with an older superblock don't support SWMR reads
+                self.db_hdf5 = h5py.File(self.file_path, "r", **cache_kwargs)
+            self._h5_pid = os.getpid()
+            # cache dataset handles and the (static) particle types once per
+            # worker to avoid HDF5 group lookups on every __getitem__
+            self._position_datasets = [
+                self.db_hdf5[f"{k}/position"] for k in self.traj_keys
+            ]
+            # probe one element: without hdf5plugin, reading a bitshuffle-
+            # compressed dataset fails with an opaque "filter not available"
+            try:
+                self._position_datasets[0][0, 0]
+            except OSError as e:
+                if hdf5plugin is None:
+                    raise OSError(
+                        f"Could not read {self.file_path}. If the dataset was "
+                        "packed with bitshuffle compression, install the "
+                        "optional hdf5plugin package."
+                    ) from e
+                raise
+            # contiguous, uncompressed datasets can bypass the HDF5 layer
+            # entirely and be sliced straight from a memory map of the file
+            self._position_memmaps = [
+                self._maybe_memmap(ds) for ds in self._position_datasets
+            ]
+            particle_types = [
+                self.db_hdf5[f"{k}/particle_type"][:] for k in self.traj_keys
+            ]
+            # in the lagrangebench datasets all trajectories of a split share the
+            # same geometry, i.e. the same particle types. Keep a single array in
+            # that case instead of num_trajs copies.
+            p0 = particle_types[0]
+            if all(
+                p.shape == p0.shape and np.array_equal(p, p0)
+                for p in particle_types[1:]
+            ):
+                particle_types = [p0] * len(particle_types)
+            self._particle_types = particle_types
+            # per-worker scratch buffer for get_window to read into, instead of
+            # letting h5py allocate a fresh (subseq_length, N, dim) per sample
+            ds0 = self._position_datasets[0]
+            num_particles_max = max(ds.shape[1] for ds in self._position_datasets)
+            self._scratch = np.empty(
+                (self.subseq_length, num_particles_max, ds0.shape[2]), dtype=ds0.dtype
+            )
+        return self.db_hdf5
+
+    def _maybe_memmap(self, ds: h5py.Dataset) -> Optional[np.memmap]:
+        """Map the raw storage of a contiguous, uncompressed dataset."""
+        if ds.chunks is not None or ds.compression is not None:
+            return None
+        offset = ds.id.get_offset()
+        if offset is None:  # e.g. no data written yet
+            return None
+        return np.memmap(
+            self.file_path, mode="r", dtype=ds.dtype, shape=ds.shape, offset=offset
+        )
 
     def _matscipy_pad(self, pos_input, particle_type):
         padding_size = self.metadata["num_particles_max"] - pos_input.shape[0]
@@ -197,10 +285,36 @@ class H5Dataset(Dataset):
         return pos_input, particle_type
 
     def get_trajectory(self, idx: int):
-        """Get a (full) trajectory and index idx."""
+        """Get a (full) trajectory and index idx.
+
+        Rollouts consume trajectories in order, so while the caller unrolls the
+        model on trajectory idx, the (large, IO-bound) read of trajectory
+        idx + 1 already runs in a background thread (double-buffering). h5py
+        serializes access with its internal lock, so one reader thread is safe.
+        """
         # open the database file
-        self.db_hdf5 = self._open_hdf5()
+        self._open_hdf5()
+
+        if self._prefetcher is None:
+            self._prefetcher = ThreadPoolExecutor(max_workers=1)
+
+        if self._prefetched is not None and self._prefetched[0] == idx:
+            item = self._prefetched[1].result()
+        else:
+            item = self._read_trajectory(idx)
 
+        next_idx = idx + 1
+        if next_idx < self.num_samples:
+            self._prefetched = (
+                next_idx,
+                self._prefetcher.submit(self._read_trajectory, next_idx),
+            )
+        else:
+            self._prefetched = None
+
+        return item
+
+    def _read_trajectory(self, idx: int):
         if self._split_valid_traj_into_n > 1:
             traj_idx = idx // self._split_valid_traj_into_n
             slice_from = (idx % self._split_valid_traj_into_n) * self.subseq_length
@@ -210,14 +324,18 @@ class H5Dataset(Dataset):
             slice_from = 0
             slice_to = self.sequence_length
 
-        # get a pointer to the trajectory. That is not yet the real trajectory.
-        traj = self.db_hdf5[f"{self.traj_keys[traj_idx]}"]
-        # get a pointer to the positions of the traj. Still nothing in memory.
-        traj_pos = traj["position"]
         # load and transpose the trajectory
-        pos_input = traj_pos[slice_from:slice_to].transpose((1, 0, 2))
+        traj_memmap = self._position_memmaps[traj_idx]
+        if traj_memmap is not None:
+            pos_input = np.ascontiguousarray(
+                traj_memmap[slice_from:slice_to].transpose((1, 0, 2))
+            )
+        else:
+            # get a pointer to the positions of the traj. Still nothing in memory.
+            traj_pos = self._position_datasets[traj_idx]
+            pos_input = traj_pos[slice_from:slice_to].transpose((1, 0, 2))
 
-        particle_type = traj["particle_type"][:]
+        particle_type = self._particle_types[traj_idx]
 
         if self.nl_backend == "matscipy":
             pos_input, particle_type = self._matscipy_pad(pos_input, particle_type)
@@ -226,26 +344,35 @@ class H5Dataset(Dataset):
 
     def get_window(self, idx: int):
         """Get a window of the trajectory and index idx."""
-        # figure out which trajectory this should be indexed from.
-        traj_idx = bisect.bisect(self._keylen_cumulative, idx)
-        # extract index of element within that trajectory.
-        el_idx = idx
-        if traj_idx != 0:
-            el_idx = idx - self._keylen_cumulative[traj_idx - 1]
-        assert el_idx >= 0
+        # figure out which trajectory this should be indexed from, and the index
+        # of the element within that trajectory.
+        traj_idx, el_idx = divmod(idx, self._samples_per_traj)
 
         # open the database file
-        self.db_hdf5 = self._open_hdf5()
+        self._open_hdf5()
 
-        # get a pointer to the trajectory. That is not yet the real trajectory.
-        traj = self.db_hdf5[f"{self.traj_keys[traj_idx]}"]
-        # get a pointer to the positions of the traj. Still nothing in memory.
-        traj_pos = traj["position"]
-        # load only a slice of the positions. Now, this is an array in memory.
-        pos_input_and_target = traj_pos[el_idx : el_idx + self.subseq_length]
-        pos_input_and_target = pos_input_and_target.transpose((1, 0, 2))
+        traj_memmap = self._position_memmaps[traj_idx]
+        if traj_memmap is not None:
+            # slice straight from the memory-mapped raw storage
+            pos_input_and_target = np.ascontiguousarray(
+                traj_memmap[el_idx : el_idx + self.subseq_length].transpose((1, 0, 2))
+            )
+        else:
+            # get a pointer to the positions of the traj. Still nothing in memory.
+            traj_pos = self._position_datasets[traj_idx]
+            # read the window into the preallocated scratch buffer
+            num_particles = traj_pos.shape[1]
+            traj_pos.read_direct(
+                self._scratch,
+                np.s_[el_idx : el_idx + self.subseq_length],
+                np.s_[:, :num_particles],
+            )
+            # (time, particles, dim) -> (particles, time, dim), one contiguous copy
+            pos_input_and_target = np.ascontiguousarray(
+                self._scratch[:, :num_particles].transpose((1, 0, 2))
+            )
 
-        particle_type = traj["particle_type"][:]
+        particle_type = self._particle_types[traj_idx]
 
         if self.nl_backend == "matscipy":
             pos_input_and_target, particle_type = self._matscipy_pad(
@@ -1,5 +1,6 @@
 """Data utils."""
 
+from collections import deque
 from typing import Dict, List
 
 import jax.numpy as jnp
@@ -49,8 +50,52 @@ def numpy_collate(batch) -> np.ndarray:
     """Collate helper for torch dataloaders."""
     # NOTE: to numpy to avoid copying twice (dataloader timeout).
     if isinstance(batch[0], np.ndarray):
+        if len(batch) == 1:
+            # batch size 1: just add the leading axis as a view, no copy
+            return batch[0][None]
         return np.stack(batch)
     if isinstance(batch[0], (tuple, list)):
         return type(batch[0])(numpy_collate(samples) for samples in zip(*batch))
     else:
         return np.asarray(batch)
+
+
+class BufferPoolCollate:
+    """Collate helper that stacks batches into a small pool of reused buffers.
+
+    Rotating a few preallocated buffers per batch shape removes the fresh
+    allocation numpy_collate pays for every batch. Only safe with
+    multiprocessing DataLoader workers, and only if the pool outlives every
+    batch the worker still has in flight: a worker's queue.put() returns
+    before the batch is pickled (a feeder thread serializes it later), and
+    the number of such un-serialized batches per worker is bounded by the
+    loader's prefetch_factor. Thus pool_size must be > prefetch_factor.
+    With num_workers=0 the consumer itself holds views into the buffers, so
+    use numpy_collate instead.
+    """
+
+    def __init__(self, pool_size: int):
+        self._pool_size = pool_size
+        # (shape, dtype) -> deque of preallocated buffers, filled lazily so
+        # each dataloader worker allocates only the shapes it actually sees
+        self._pools = {}
+
+    def __call__(self, batch) -> np.ndarray:
+        if isinstance(batch[0], np.ndarray):
+            if len(batch) == 1:
+                return batch[0][None]
+            shape = (len(batch), *batch[0].shape)
+            key = (shape, batch[0].dtype.str)
+            pool = self._pools.setdefault(
+                key,
+                deque(
+                    np.empty(shape, dtype=batch[0].dtype)
+                    for _ in range(self._pool_size)
+                ),
+            )
+            pool.rotate(1)
+            return np.stack(batch, out=pool[0])
+        if isinstance(batch[0], (tuple, list)):
+            return type(batch[0])(self(samples) for samples in zip(*batch))
+        else:
+            return np.asarray(batch)
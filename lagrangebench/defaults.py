@@ -52,6 +52,11 @@ def set_defaults(cfg: DictConfig = OmegaConf.create({})) -> DictConfig:
     #  whether to normalize dimensions equally
     cfg.model.isotropic_norm = False
 
+    # EGNN only parameters
+    # compute dtype of the scalar edge/node MLPs. One of "float32" or "bfloat16".
+    # Params and the equivariant position update always stay in float32.
+    cfg.model.egnn_mlp_dtype = "float32"
+
     # SEGNN only parameters
     # steerable attributes level
     cfg.model.lmax_attributes = 1
@@ -71,8 +76,12 @@ def set_defaults(cfg: DictConfig = OmegaConf.create({})) -> DictConfig:
     cfg.train.step_max = 500_000
     # number of workers for data loading
     cfg.train.num_workers = 4
+    # number of batches loaded in advance by each worker (ignored without workers)
+    cfg.train.prefetch_factor = 4
     # standard deviation of the GNS-style noise
     cfg.train.noise_std = 3.0e-4
+    # run the model compute in bfloat16 (params and outputs stay in float32)
+    cfg.train.mixed_precision = False
 
     # optimizer
     cfg.train.optimizer = OmegaConf.create({})
@@ -85,6 +94,9 @@ def set_defaults(cfg: DictConfig = OmegaConf.create({})) -> DictConfig:
     cfg.train.optimizer.lr_decay_rate = 0.1
     # number of steps to decay learning rate
     cfg.train.optimizer.lr_decay_steps = 1.0e5
+    # storage dtype of the adamw first moment; bfloat16 cuts optimizer state
+    # memory by a quarter, the second moment always stays in float32
+    cfg.train.optimizer.mu_dtype = "bfloat16"
 
     # pushforward
     cfg.train.pushforward = OmegaConf.create({})
@@ -187,6 +199,7 @@ def check_cfg(cfg: DictConfig):
     assert cfg.dataset.src is not None, "dataset.src must be specified."
 
     assert cfg.model.input_seq_length >= 2, "At least two positions for one past vel."
+    assert cfg.model.egnn_mlp_dtype in ["float32", "bfloat16"]
 
     pf = cfg.train.pushforward
     assert len(pf.steps) == len(pf.unrolls) == len(pf.probs)
@@ -10,6 +10,7 @@ import haiku as hk
 import jax
 import jax.numpy as jnp
 import jax_sph.jax_md.partition as partition
+import numpy as np
 from jax import jit, vmap
 from omegaconf import DictConfig, OmegaConf
 from torch.utils.data import DataLoader
@@ -75,9 +76,93 @@ def _forward_eval(
     return current_positions, state
 
 
+@partial(
+    jit,
+    static_argnames=["model_apply", "case_integrate", "preprocess_eval", "traj_len"],
+)
+def _scan_rollout(
+    params: hk.Params,
+    state: hk.State,
+    current_positions_batch: jnp.ndarray,
+    particle_type_batch: jnp.ndarray,
+    target_positions_batch: jnp.ndarray,
+    neighbors_batch: partition.NeighborList,
+    model_apply: Callable,
+    case_integrate: Callable,
+    preprocess_eval: Callable,
+    traj_len: int,
+):
+    """Unroll the model for traj_len steps as a single fused lax.scan.
+
+    Compared to a Python loop over the steps, this compiles the entire rollout
+    into one XLA program: no per-step dispatch and no host sync on the
+    neighbor-list overflow flag inside the loop. Overflows are instead
+    accumulated per batch sample; once a sample overflows, its carry is frozen
+    and its positions at the moment of overflow are recorded, so the caller
+    can reallocate a fitting neighbor list and rerun the scan.
+
+    The static arguments are the long-lived model and case functions (not
+    per-call vmap wrappers), so the jit cache key stays stable across repeated
+    eval_rollout calls, e.g. the periodic validation during training.
+
+    Returns:
+        Tuple of (predictions (batch, traj_len, n_nodes, dim), neighbor list,
+        model state, per-sample overflow flags, positions at first overflow).
+    """
+    forward_eval = partial(
+        _forward_eval, model_apply=model_apply, case_integrate=case_integrate
+    )
+    forward_eval_vmap = vmap(forward_eval, in_axes=(None, None, 0, 0, 0))
+    preprocess_eval_vmap = vmap(preprocess_eval, in_axes=(0, 0))
+
+    def body(carry, step):
+        current_pos, nbrs, state, overflow, overflow_pos = carry
+
+        features, nbrs = preprocess_eval_vmap((current_pos, particle_type_batch), nbrs)
+
+        # record the positions at the first overflow of each sample, so the
+        # reallocation happens on the configuration that overflowed the list
+        newly_overflowed = nbrs.did_buffer_overflow.astype(bool) & ~overflow
+        overflow_pos = jnp.where(
+            newly_overflowed[:, None, None, None], current_pos, overflow_pos
+        )
+        overflow = overflow | newly_overflowed
+
+        new_pos, state_batch = forward_eval_vmap(
+            params,
+            state,
+            (features, particle_type_batch),
+            current_pos,
+            target_positions_batch[:, :, step],
+        )
+        # freeze overflowed samples; their features are garbage from here on
+        current_pos = jnp.where(
+            overflow[:, None, None, None], current_pos, new_pos
+        )
+        state = broadcast_from_batch(state_batch, 0)
+
+        carry = (current_pos, nbrs, state, overflow, overflow_pos)
+        return carry, current_pos[:, :, -1]  # most recently predicted positions
+
+    overflow = jnp.zeros(current_positions_batch.shape[0], dtype=bool)
+    init = (
+        current_positions_batch,
+        neighbors_batch,
+        state,
+        overflow,
+        current_positions_batch,
+    )
+    carry, predictions_batch = jax.lax.scan(body, init, jnp.arange(traj_len))
+    _, neighbors_batch, state, overflow, overflow_pos = carry
+
+    # (time, batch, n_nodes, dim) -> (batch, time, n_nodes, dim)
+    predictions_batch = predictions_batch.transpose(1, 0, 2, 3)
+
+    return predictions_batch, neighbors_batch, state, overflow, overflow_pos
+
+
 def _eval_batched_rollout(
-    forward_eval_vmap: Callable,
-    preprocess_eval_vmap: Callable,
+    model_apply: Callable,
     case,
     params: hk.Params,
     state: hk.State,
@@ -91,7 +176,7 @@ def _eval_batched_rollout(
     """Compute the rollout on a single trajectory.
 
     Args:
-        forward_eval_vmap: Model function.
+        model_apply: Model function.
         case: CaseSetupFn class.
         params: Haiku params.
         state: Haiku state.
@@ -119,54 +204,40 @@ def _eval_batched_rollout(
     traj_len = n_rollout_steps + n_extrap_steps
     target_positions_batch = pos_input_batch[:, :, t_window : t_window + traj_len]
 
-    predictions_batch = jnp.zeros((current_batch_size, traj_len, n_nodes_max, dim))
     neighbors_batch = broadcast_to_batch(neighbors, current_batch_size)
 
-    step = 0
-    while step < n_rollout_steps + n_extrap_steps:
-        sample_batch = (current_positions_batch, particle_type_batch)
-
-        # 1. preprocess features
-        features_batch, neighbors_batch = preprocess_eval_vmap(
-            sample_batch, neighbors_batch
+    while True:
+        predictions_batch, nbrs_batch, state, overflow, overflow_pos = _scan_rollout(
+            params,
+            state,
+            current_positions_batch,
+            particle_type_batch,
+            target_positions_batch,
+            neighbors_batch,
+            model_apply=model_apply,
+            case_integrate=case.integrate,
+            preprocess_eval=case.preprocess_eval,
+            traj_len=traj_len,
         )
 
-        # 2. check whether list overflowed and fix it if so
-        if neighbors_batch.did_buffer_overflow.sum() > 0:
-            # check if the neighbor list is too small for any of the samples
-            # if so, reallocate the neighbor list
-
-            print(f"(eval) Reallocate neighbors list at step {step}")
-            ind = jnp.argmax(neighbors_batch.did_buffer_overflow)
-            sample = broadcast_from_batch(sample_batch, index=ind)
+        # check if the neighbor list was too small for any of the samples
+        # if so, reallocate it and rerun the whole rollout with the new size
+        if overflow.sum() > 0:
+            print("(eval) Reallocate neighbors list")
+            ind = jnp.argmax(overflow)
+            # reallocate on the positions at the moment of overflow, otherwise
+            # the list could be sized for the (sparser) initial configuration
+            sample = (overflow_pos[ind], particle_type_batch[ind])
 
             _, nbrs_temp = case.allocate_eval(sample)
             print(
                 f"(eval) From {neighbors_batch.idx[ind].shape} to {nbrs_temp.idx.shape}"
             )
             neighbors_batch = broadcast_to_batch(nbrs_temp, current_batch_size)
-
-            # To run the loop N times even if sometimes
-            # did_buffer_overflow > 0 we directly return to the beginning
             continue
 
-        # 3. run forward model
-        current_positions_batch, state_batch = forward_eval_vmap(
-            params,
-            state,
-            (features_batch, particle_type_batch),
-            current_positions_batch,
-            target_positions_batch[:, :, step],
-        )
-        # the state is not passed out of this loop, so no not really relevant
-        state = broadcast_from_batch(state_batch, 0)
-
-        # 4. write predicted next position to output array
-        predictions_batch = predictions_batch.at[:, step].set(
-            current_positions_batch[:, :, -1]  # most recently predicted positions
-        )
-
-        step += 1
+        neighbors_batch = nbrs_batch
+        break
 
     # (batch, n_nodes, time, dim) -> (batch, time, n_nodes, dim)
     target_positions_batch = target_positions_batch.transpose(0, 2, 1, 3)
@@ -218,29 +289,30 @@ def eval_rollout(
     if rollout_dir is not None:
         os.makedirs(rollout_dir, exist_ok=True)
 
-    forward_eval = partial(
-        _forward_eval,
-        model_apply=model_apply,
-        case_integrate=case.integrate,
-    )
-    forward_eval_vmap = vmap(forward_eval, in_axes=(None, None, 0, 0, 0))
-    preprocess_eval_vmap = vmap(case.preprocess_eval, in_axes=(0, 0))
     metrics_computer_vmap = vmap(metrics_computer, in_axes=(0, 0))
 
     for i, traj_batch_i in enumerate(loader_eval):
-        # if n_trajs is not a multiple of batch_size, we slice from the last batch
-        n_traj_left = n_trajs - i * batch_size
-        if n_traj_left < batch_size:
-            traj_batch_i = jax.tree_map(lambda x: x[:n_traj_left], traj_batch_i)
+        # number of trajectories of this batch that count towards n_trajs. The
+        # last batch can hold fewer, either because the loader ran out of data
+        # or because n_trajs is not a multiple of batch_size.
+        n_valid = min(n_trajs - i * batch_size, traj_batch_i[0].shape[0])
+        if traj_batch_i[0].shape[0] < batch_size:
+            # pad the short last batch to full size by repeating its final
+            # trajectory: shapes stay static, so the jitted rollout does not
+            # recompile. Padded entries are dropped from the outputs below.
+            pad = batch_size - traj_batch_i[0].shape[0]
+            traj_batch_i = jax.tree_util.tree_map(
+                lambda x: np.concatenate([x, np.repeat(x[-1:], pad, axis=0)]),
+                traj_batch_i,
+            )
 
-        # numpy to jax
-        traj_batch_i = jax.tree_map(lambda x: jnp.array(x), traj_batch_i)
+        # numpy to jax, one fused transfer for the whole batch
+        traj_batch_i = jax.device_put(traj_batch_i)
         # (pos_input_batch, particle_type_batch) = traj_batch_i
         # pos_input_batch.shape = (batch, num_particles, seq_length, dim)
 
         example_rollout_batch, metrics_batch, neighbors = _eval_batched_rollout(
-            forward_eval_vmap=forward_eval_vmap,
-            preprocess_eval_vmap=preprocess_eval_vmap,
+            model_apply=model_apply,
             case=case,
             params=params,
             state=state,
@@ -252,8 +324,7 @@ def eval_rollout(
             n_extrap_steps=n_extrap_steps,
         )
 
-        current_batch_size = traj_batch_i[0].shape[0]
-        for j in range(current_batch_size):
+        for j in range(n_valid):
             # write metrics to output dictionary
             ind = i * batch_size + j
             eval_metrics[f"rollout_{ind}"] = broadcast_from_batch(metrics_batch, j)
@@ -262,7 +333,7 @@ def eval_rollout(
             # (batch, nodes, t, dim) -> (batch, t, nodes, dim)
             pos_input_batch = traj_batch_i[0].transpose(0, 2, 1, 3)
 
-            for j in range(current_batch_size):  # write every trajectory to file
+            for j in range(n_valid):  # write every valid trajectory to file
                 pos_input = pos_input_batch[j]
                 example_rollout = example_rollout_batch[j]
 
@@ -7,13 +7,13 @@ Original implementation: https://github.com/vgsatorras/egnn
 Standalone implementation + validation: https://github.com/gerkone/egnn-jax
 """
 
-from typing import Any, Callable, Dict, Optional, Tuple
+from functools import partial
+from typing import Callable, Dict, Optional, Tuple
 
 import haiku as hk
 import jax
 import jax.numpy as jnp
 import jraph
-from jax.tree_util import Partial
 from jax_sph.jax_md import space
 
 from lagrangebench.utils import NodeType
@@ -91,7 +91,9 @@ class EGNNLayer(hk.Module):
         )
 
         # position update network
-        net = [LinearXav(hidden_size)] * blocks
+        # NOTE: one module per block; [LinearXav(...)] * blocks would reuse the
+        # same module object and thus the same parameters for every block
+        net = [LinearXav(hidden_size) for _ in range(blocks)]
         # NOTE: from https://github.com/vgsatorras/egnn/blob/main/models/gcl.py#L254
         net += [
             act_fn,
@@ -102,7 +104,7 @@ class EGNNLayer(hk.Module):
         self._pos_correction_mlp = hk.Sequential(net)
 
         # velocity integrator network
-        net = [LinearXav(hidden_size)] * blocks
+        net = [LinearXav(hidden_size) for _ in range(blocks)]
         net += [
             act_fn,
             LinearXav(1, with_bias=False, w_init=hk.initializers.UniformScaling(dt)),
@@ -129,13 +131,9 @@ class EGNNLayer(hk.Module):
         self,
         radial: jnp.ndarray,
         edge_attribute: jnp.ndarray,
-        edge_features: Any,
         incoming: jnp.ndarray,
         outgoing: jnp.ndarray,
-        globals_: Any,
     ) -> jnp.ndarray:
-        _ = edge_features
-        _ = globals_
         msg = jnp.concatenate([incoming, outgoing, radial], axis=-1)
         if edge_attribute is not None:
             msg = jnp.concatenate([msg, edge_attribute], axis=-1)
@@ -149,12 +147,8 @@ class EGNNLayer(hk.Module):
         self,
         node_attribute: jnp.ndarray,
         nodes: jnp.ndarray,
-        senders: Any,
         msg: jnp.ndarray,
-        globals_: Any,
     ) -> jnp.ndarray:
-        _ = senders
-        _ = globals_
         x = jnp.concatenate([nodes, msg], axis=-1)
         if node_attribute is not None:
             x = jnp.concatenate([x, node_attribute], axis=-1)
@@ -167,10 +161,11 @@ class EGNNLayer(hk.Module):
         self, graph: jraph.GraphsTuple, coord: jnp.array
     ) -> Tuple[jnp.array, jnp.array]:
         coord_diff = self._displacement_fn(coord[graph.senders], coord[graph.receivers])
-        radial = jnp.sum(coord_diff**2, 1)[:, jnp.newaxis]
+        # single-pass squared-norm reduction over the edge axis
+        radial = jnp.einsum("ed,ed->e", coord_diff, coord_diff)[:, jnp.newaxis]
         if self._normalize:
-            norm = jnp.sqrt(radial)
-            coord_diff = coord_diff / (norm + self._eps)
+            # rsqrt + multiply instead of sqrt + divide; eps**2 guards zero edges
+            coord_diff = coord_diff * jax.lax.rsqrt(radial + self._eps**2)
         return radial, coord_diff
 
     def __call__(
@@ -194,11 +189,19 @@ class EGNNLayer(hk.Module):
             Updated graph, node position
         """
         radial, coord_diff = self._coord2radial(graph, pos)
-        graph = jraph.GraphNetwork(
-            update_edge_fn=Partial(self._message, radial, edge_attribute),
-            update_node_fn=Partial(self._update, node_attribute),
-            aggregate_edges_for_nodes_fn=self.msg_aggregate_fn,
-        )(graph)
+        # edge and node updates, inlined instead of dispatching through
+        # jraph.GraphNetwork with Partial-wrapped update functions
+        msg = self._message(
+            radial,
+            edge_attribute,
+            graph.nodes[graph.senders],
+            graph.nodes[graph.receivers],
+        )
+        agg_msg = self.msg_aggregate_fn(
+            msg, graph.receivers, num_segments=pos.shape[0]
+        )
+        nodes = self._update(node_attribute, graph.nodes, agg_msg)
+        graph = graph._replace(nodes=nodes, edges=msg)
         # update position
         pos = self._shift_fn(pos, self._pos_update(pos, graph, coord_diff))
         # integrate velocity
@@ -325,8 +328,13 @@ class EGNN(BaseModel):
 
         # most recent position
         props["pos"] = features["abs_pos"][:, -1]
+        # sort edges by sender so the position update can aggregate with a
+        # sorted segment sum. Padded edges (sender == n_nodes) stay at the end.
+        order = jnp.argsort(features["senders"])
+        senders = features["senders"][order]
+        receivers = features["receivers"][order]
         # relative distances between particles
-        props["edge_attr"] = features["rel_dist"]
+        props["edge_attr"] = features["rel_dist"][order]
         # force magnitude as node attributes
         props["node_attr"] = None
         if "force" in features:
@@ -334,14 +342,8 @@ class EGNN(BaseModel):
                 jnp.sum(features["force"] ** 2, axis=-1, keepdims=True)
             )
 
-        # velocity magnitudes as node features
-        node_features = jnp.concatenate(
-            [
-                jnp.sqrt(jnp.sum(props["vel"][:, i, :] ** 2, axis=-1, keepdims=True))
-                for i in range(self._n_vels)
-            ],
-            axis=-1,
-        )
+        # velocity magnitudes as node features, one (n_nodes, n_vels) reduction
+        node_features = jnp.linalg.norm(props["vel"], axis=-1)
         if not self._homogeneous_particles:
             particles = jax.nn.one_hot(particle_type, NodeType.SIZE)
             node_features = jnp.concatenate([node_features, particles], axis=-1)
@@ -349,10 +351,10 @@ class EGNN(BaseModel):
         graph = jraph.GraphsTuple(
             nodes=node_features,
             edges=None,
-            senders=features["senders"],
-            receivers=features["receivers"],
+            senders=senders,
+            receivers=receivers,
             n_node=jnp.array([n_nodes]),
-            n_edge=jnp.array([len(features["senders"])]),
+            n_edge=jnp.array([len(senders)]),
             globals=None,
         )
 
@@ -378,22 +380,37 @@ class EGNN(BaseModel):
         prev_vel = props["vel"][:, -1, :]
         # egnn works with unnormalized velocities
         prev_vel = prev_vel * self._vel_stats["std"] + self._vel_stats["mean"]
-        # message passing
+        # message passing. All layers have identical parameter shapes, so they
+        # are applied with hk.experimental.layer_stack (parameters stacked on a
+        # leading num_mp_steps axis) instead of unrolling num_mp_steps copies of
+        # the layer into the HLO graph.
         next_pos = props["pos"].copy()
-        for n in range(self._num_mp_steps):
-            graph, next_pos = EGNNLayer(
-                layer_num=n,
+        # placeholder edges so the carry structure is fixed across iterations.
+        # The message function ignores the previous edge features.
+        graph = graph._replace(
+            edges=jnp.zeros((graph.senders.shape[0], self._hidden_size), h.dtype)
+        )
+
+        def mp_layer(graph, pos):
+            return EGNNLayer(
+                layer_num=0,
                 hidden_size=self._hidden_size,
                 output_size=self._hidden_size,
                 displacement_fn=self._displacement_fn,
                 shift_fn=self._shift_fn,
                 act_fn=self._act_fn,
+                # senders are sorted in _transform
+                pos_aggregate_fn=partial(jraph.segment_sum, indices_are_sorted=True),
                 residual=self._residual,
                 attention=self._attention,
                 normalize=self._normalize,
                 dt=self._dt,
                 tanh=self._tanh,
-            )(graph, next_pos, prev_vel, props["edge_attr"], props["node_attr"])
+            )(graph, pos, prev_vel, props["edge_attr"], props["node_attr"])
+
+        graph, next_pos = hk.experimental.layer_stack(
+            self._num_mp_steps, name="egnn_stack"
+        )(mp_layer)(graph, next_pos)
 
         # position finite differencing to get acceleration
         out = self._postprocess(next_pos, props)
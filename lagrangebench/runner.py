@@ -18,7 +18,7 @@ from lagrangebench.case_setup import case_builder
 from lagrangebench.data import H5Dataset
 from lagrangebench.defaults import check_cfg
 from lagrangebench.evaluate import averaged_metrics
-from lagrangebench.models.utils import node_irreps
+from lagrangebench.models.utils import MLPXav, node_irreps
 from lagrangebench.utils import NodeType
 
 
@@ -68,9 +68,20 @@ def train_or_infer(cfg: Union[Dict, DictConfig]):
 
     # mixed precision training based on this reference:
     # https://github.com/deepmind/dm-haiku/blob/main/examples/imagenet/train.py
-    policy = jmp.get_policy("params=float32,compute=float32,output=float32")
+    if cfg.train.mixed_precision:
+        # bf16 activations halve the bandwidth of the (memory-bound) message
+        # passing; params and the outputs fed to the loss stay in float32
+        policy = jmp.get_policy("params=float32,compute=bfloat16,output=float32")
+    else:
+        policy = jmp.get_policy("params=float32,compute=float32,output=float32")
     hk.mixed_precision.set_policy(MODEL, policy)
 
+    if cfg.model.name.lower() == "egnn" and cfg.model.egnn_mlp_dtype == "bfloat16":
+        # run the scalar edge/node MLPs in bfloat16 while keeping the params and
+        # the equivariant position update (plain LinearXav layers) in float32
+        mlp_policy = jmp.get_policy("params=float32,compute=bfloat16,output=float32")
+        hk.mixed_precision.set_policy(MLPXav, mlp_policy)
+
     if mode == "train" or mode == "all":
         print("Start training...")
 
@@ -245,7 +256,8 @@ def setup_model(
         MODEL = models.SEGNN
     elif model_name == "egnn":
         box = cfg.box
-        if jnp.array(metadata["periodic_boundary_conditions"]).any():
+        # static host-side decision, so only the chosen branch is traced
+        if np.array(metadata["periodic_boundary_conditions"]).any():
             displacement_fn, shift_fn = space.periodic(jnp.array(box))
         else:
             displacement_fn, shift_fn = space.free()
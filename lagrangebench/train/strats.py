@@ -94,12 +94,14 @@ def push_forward_sample_steps(key, step, pushforward):
     """
     key, key_unroll = jax.random.split(key, 2)
 
-    # steps needs to be an ordered list
-    steps = jnp.array(pushforward.steps)
+    # steps needs to be an ordered list. Checked on plain Python ints: going
+    # through jnp here would sync the host with the device on every training
+    # step just to compare configuration constants.
+    steps = list(pushforward.steps)
     assert all(steps[i] <= steps[i + 1] for i in range(len(steps) - 1))
 
     # until which index to sample from
-    idx = (step > steps).sum()
+    idx = sum(step > s for s in steps)
 
     unroll_steps = jax.random.choice(
         key_unroll,
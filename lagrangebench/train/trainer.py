@@ -1,6 +1,8 @@
 """Training utils and functions."""
 
 import os
+import queue
+import threading
 from collections import namedtuple
 from functools import partial
 from typing import Callable, Dict, Optional, Tuple, Union
@@ -16,7 +18,7 @@ from omegaconf import DictConfig, OmegaConf
 from torch.utils.data import DataLoader
 
 from lagrangebench.data import H5Dataset
-from lagrangebench.data.utils import numpy_collate
+from lagrangebench.data.utils import BufferPoolCollate, numpy_collate
 from lagrangebench.defaults import defaults
 from lagrangebench.evaluate import MetricsComputer, averaged_metrics, eval_rollout
 from lagrangebench.utils import (
@@ -32,7 +34,7 @@ from lagrangebench.utils import (
 from .strats import push_forward_build, push_forward_sample_steps
 
 
-@partial(jax.jit, static_argnames=["model_fn", "loss_weight"])
+@partial(jax.jit, static_argnames=["model_fn", "loss_weight", "loss_keys"])
 def _mse(
     params: hk.Params,
     state: hk.State,
@@ -41,26 +43,33 @@ def _mse(
     target: jnp.ndarray,
     model_fn: Callable,
     loss_weight: Dict[str, float],
+    loss_keys: Tuple[str, ...],
 ):
     pred, state = model_fn(params, state, (features, particle_type))
     # check active (non zero) output shapes
-    assert all(target[k].shape == pred[k].shape for k in pred)
+    assert all(target[k].shape == pred[k].shape for k in loss_keys)
     # particle mask
     non_kinematic_mask = jnp.logical_not(get_kinematic_mask(particle_type))
     num_non_kinematic = non_kinematic_mask.sum()
-    # loss components
-    losses = []
-    for t in pred:
+    # loss components, accumulated in place so XLA fuses the additions into a
+    # single reduction instead of stacking a (num_keys, N) temporary. The
+    # active (non-zero weight) keys are precomputed once in the Trainer, so
+    # zero-weight terms never enter the graph.
+    total_loss = 0.0
+    for t in loss_keys:
         w = getattr(loss_weight, t)
-        losses.append((w * (pred[t] - target[t]) ** 2).sum(axis=-1))
-    total_loss = jnp.array(losses).sum(0)
+        total_loss = total_loss + (w * (pred[t] - target[t]) ** 2).sum(axis=-1)
     total_loss = jnp.where(non_kinematic_mask, total_loss, 0)
     total_loss = total_loss.sum() / num_non_kinematic
 
     return total_loss, state
 
 
-@partial(jax.jit, static_argnames=["loss_fn", "opt_update"])
+# features_batch and target_batch are dead after the update, so their (large)
+# device buffers are donated to the outputs. params/state/opt_state cannot be
+# donated: the training loop keeps using the old ones when it discards an
+# update after a neighbor list overflow.
+@partial(jax.jit, static_argnames=["loss_fn", "opt_update"], donate_argnums=(2, 3))
 def _update(
     params: hk.Params,
     state: hk.State,
@@ -71,17 +80,24 @@ def _update(
     loss_fn: Callable,
     opt_update: Callable,
 ) -> Tuple[float, hk.Params, hk.State, optax.OptState]:
-    value_and_grad_vmap = vmap(
-        jax.value_and_grad(loss_fn, has_aux=True), in_axes=(None, None, 0, 0, 0)
-    )
-    (loss, state), grads = value_and_grad_vmap(
-        params, state, features_batch, particle_type_batch, target_batch
+    def batched_loss_fn(params, state):
+        loss, state = vmap(loss_fn, in_axes=(None, None, 0, 0, 0))(
+            params, state, features_batch, particle_type_batch, target_batch
+        )
+        # differentiating the summed loss gives the same summed gradients as
+        # before, but folds the batch reduction into the backward pass instead
+        # of materializing per-sample gradients of shape (B, *param_shape)
+        return loss.sum(), (loss, state)
+
+    (_, (loss, state)), grads = jax.value_and_grad(batched_loss_fn, has_aux=True)(
+        params, state
     )
 
-    # aggregate over the first (batch) dimension of each leave element
-    grads = jax.tree_map(lambda x: x.sum(axis=0), grads)
-    state = jax.tree_map(lambda x: x.sum(axis=0), state)
-    loss = jax.tree_map(lambda x: x.mean(axis=0), loss)
+    # the models used here carry no (or per-sample identical) haiku state, so
+    # keep the first replica rather than materializing and summing B copies.
+    # Summation also silently multiplied counter-like state by the batch size.
+    state = jax.tree_util.tree_map(lambda x: x[0], state)
+    loss = loss.mean(axis=0)
 
     updates, opt_state = opt_update(grads, opt_state, params)
     new_params = optax.apply_updates(params, updates)
@@ -89,6 +105,35 @@ def _update(
     return loss, new_params, state, opt_state
 
 
+def _device_prefetch(loader, prefetch_size: int = 2):
+    """Iterate over a dataloader with the host-to-device copy running ahead.
+
+    A background thread moves up to prefetch_size batches to the device with
+    jax.device_put while the training step on the current batch is running
+    (double-buffering), so the transfer is off the critical path.
+    """
+    q = queue.Queue(maxsize=prefetch_size)
+    end = object()
+
+    def producer():
+        try:
+            for batch in loader:
+                q.put(jax.device_put(batch))
+            q.put(end)
+        except Exception as e:  # surface dataloader errors in the consumer
+            q.put(e)
+
+    threading.Thread(target=producer, daemon=True).start()
+
+    while True:
+        batch = q.get()
+        if batch is end:
+            break
+        if isinstance(batch, Exception):
+            raise batch
+        yield batch
+
+
 class Trainer:
     """
     Trainer class.
@@ -163,19 +208,38 @@ class Trainer:
         # make immutable for jitting
         loss_weight = self.cfg_train.loss_weight
         self.loss_weight = namedtuple("loss_weight", loss_weight)(**loss_weight)
+        # loss terms with non-zero weight, precomputed once as a static arg
+        self.loss_keys = tuple(sorted(k for k, w in loss_weight.items() if w > 0))
 
         self.base_key, seed_worker, generator = set_seed(seed)
 
         # dataloaders
+        worker_kwargs = {}
+        train_collate = numpy_collate
+        if self.cfg_train.num_workers > 0:
+            # keep workers (and their open HDF5 handles) alive across epochs and
+            # let each worker read ahead, so batch loading overlaps training
+            worker_kwargs = {
+                "persistent_workers": True,
+                "prefetch_factor": self.cfg_train.prefetch_factor,
+            }
+            # with workers, batches are copied during inter-process transfer,
+            # so collating into reused buffers is safe and saves an allocation.
+            # A worker can hold up to prefetch_factor not-yet-serialized
+            # batches, so the pool must be strictly larger than that.
+            train_collate = BufferPoolCollate(
+                pool_size=self.cfg_train.prefetch_factor + 1
+            )
         self.loader_train = DataLoader(
             dataset=data_train,
             batch_size=self.cfg_eval.train.batch_size,
             shuffle=True,
             num_workers=self.cfg_train.num_workers,
-            collate_fn=numpy_collate,
+            collate_fn=train_collate,
             drop_last=True,
             worker_init_fn=seed_worker,
             generator=generator,
+            **worker_kwargs,
         )
         self.loader_valid = DataLoader(
             dataset=data_valid,
@@ -194,7 +258,9 @@ class Trainer:
         )
         # optimizer
         self.opt_init, self.opt_update = optax.adamw(
-            learning_rate=lr_scheduler, weight_decay=1e-8
+            learning_rate=lr_scheduler,
+            weight_decay=1e-8,
+            mu_dtype=jnp.dtype(self.cfg_train.optimizer.mu_dtype),
         )
 
         # metrics computer config
@@ -249,12 +315,17 @@ class Trainer:
         model_apply = jax.jit(model.apply)
 
         # loss and update functions
-        loss_fn = partial(_mse, model_fn=model_apply, loss_weight=self.loss_weight)
+        loss_fn = partial(
+            _mse,
+            model_fn=model_apply,
+            loss_weight=self.loss_weight,
+            loss_keys=self.loss_keys,
+        )
         update_fn = partial(_update, loss_fn=loss_fn, opt_update=self.opt_update)
 
         # init values
         raw_batch = next(iter(loader_train))
-        raw_batch = jax.tree_map(lambda x: jnp.array(x), raw_batch)  # numpy to jax
+        raw_batch = jax.device_put(raw_batch)  # numpy to jax, one fused transfer
         pos_input_and_target, particle_type = raw_batch
         raw_sample = (pos_input_and_target[0], particle_type[0])
         key, features, _, neighbors = case.allocate(self.base_key, raw_sample)
@@ -272,6 +343,12 @@ class Trainer:
             key, subkey = jax.random.split(key, 2)
             params, state = model.init(subkey, (features, particle_type[0]))
 
+        # abstractly evaluate the single-sample forward pass so shape/dtype
+        # errors surface here rather than deep inside the first fused training
+        # step. This only traces; the fused step and the rollout compile the
+        # model in their own programs on first use.
+        jax.eval_shape(model_apply, params, state, (features, particle_type[0]))
+
         # start logging
         if cfg_logging.wandb:
             if wandb_config is None:
@@ -315,38 +392,132 @@ class Trainer:
         push_forward = push_forward_build(model_apply, case)
         push_forward_vmap = jax.vmap(push_forward, in_axes=(0, 0, 0, 0, None, None))
 
+        # pushforward unroll as one jitted scan over the maximum unroll length.
+        # A Python loop over the sampled unroll_steps would retrace for every
+        # distinct value; here iterations beyond unroll_steps (or after a
+        # neighbor list overflow) pass the carry through untouched.
+        max_unroll = max(pushforward.unrolls)
+        isl = self.input_seq_length
+
+        @jax.jit
+        def unroll_vmap(
+            params,
+            state,
+            pos_input_batch,
+            particle_type_batch,
+            nbrs,
+            feats,
+            unroll_steps,
+        ):
+            # slice of the input positions for the first unroll step; done
+            # inside the jit so it fuses into the scan instead of launching
+            # a separate gather per training step (isl is a closed-over int)
+            current_pos = pos_input_batch[:, :, :isl]
+            overflow = nbrs.did_buffer_overflow.sum() > 0
+
+            def unroll_body(carry, i):
+                current_pos, nbrs, feats, overflow = carry
+                keep = (i < unroll_steps) & ~overflow
+
+                # keep is a scalar here, so this lowers to a real HLO
+                # conditional: iterations beyond unroll_steps (or after an
+                # overflow) skip the model forward entirely, instead of
+                # computing it and masking the result away
+                def active(_):
+                    current_pos_new, nbrs_new, feats_new = push_forward_vmap(
+                        feats, current_pos, particle_type_batch, nbrs, params, state
+                    )
+                    overflow_new = overflow | (nbrs_new.did_buffer_overflow.sum() > 0)
+                    return (current_pos_new, nbrs_new, feats_new, overflow_new)
+
+                def inactive(_):
+                    return (current_pos, nbrs, feats, overflow)
+
+                return jax.lax.cond(keep, active, inactive, None), None
+
+            carry = (current_pos, nbrs, feats, overflow)
+            carry, _ = jax.lax.scan(unroll_body, carry, jnp.arange(max_unroll))
+            _, nbrs, feats, _ = carry
+            # only the neighbor list and features are consumed by the update
+            return nbrs, feats
+
+        # one fused jit for preprocess + pushforward unroll + update: XLA fuses
+        # the noise injection and feature construction into the forward pass
+        # and keeps features/targets internal to a single executable, instead
+        # of round-tripping them through device memory between three dispatches
+        @jax.jit
+        def fused_step(params, state, opt_state, keys, raw_batch, nbrs, unroll_steps):
+            # target computation incorporates the sampled pushforward steps
+            keys, features_batch, target_batch, nbrs = preprocess_vmap(
+                keys,
+                raw_batch,
+                noise_std,
+                nbrs,
+                unroll_steps,
+            )
+            # unroll for push-forward steps
+            if max_unroll > 0:
+                nbrs, features_batch = unroll_vmap(
+                    params,
+                    state,
+                    raw_batch[0],
+                    raw_batch[1],
+                    nbrs,
+                    features_batch,
+                    unroll_steps,
+                )
+
+            loss, params, state, opt_state = update_fn(
+                params=params,
+                state=state,
+                features_batch=features_batch,
+                target_batch=target_batch,
+                particle_type_batch=raw_batch[1],
+                opt_state=opt_state,
+            )
+            return loss, params, state, opt_state, nbrs, keys
+
+        def log_loss(log_step, log_loss_value):
+            if cfg_logging.wandb:
+                wandb_run.log({"train/loss": log_loss_value.item()}, log_step)
+            else:
+                step_str = str(log_step).zfill(len(str(int(step_max))))
+                print(f"{step_str}, train/loss: {log_loss_value.item():.5f}.")
+
+        # the loss of one log boundary is reported at the next one (and flushed
+        # after training), when its value has long been computed: .item() then
+        # returns immediately instead of stalling the device pipeline
+        pending_log = None
+
         # prepare for batch training.
         keys = jax.random.split(key, loader_train.batch_size)
         neighbors_batch = broadcast_to_batch(neighbors, loader_train.batch_size)
 
         # start training
         while step < step_max + 1:
-            for raw_batch in loader_train:
-                # numpy to jax
-                raw_batch = jax.tree_map(lambda x: jnp.array(x), raw_batch)
-
+            # batches arrive on device via the background prefetcher
+            for raw_batch in _device_prefetch(loader_train):
                 key, unroll_steps = push_forward_sample_steps(key, step, pushforward)
-                # target computation incorporates the sampled number pushforward steps
-                _keys, features_batch, target_batch, neighbors_batch = preprocess_vmap(
+                # dispatch the fused step before the overflow check: reading
+                # did_buffer_overflow blocks the host on the device anyway, so
+                # the step kernels overlap with that sync instead of waiting
+                # for it. Overflows are rare, and the update is discarded then.
+                (
+                    loss,
+                    new_params,
+                    new_state,
+                    new_opt_state,
+                    neighbors_batch,
+                    _keys,
+                ) = fused_step(
+                    params,
+                    state,
+                    opt_state,
                     keys,
                     raw_batch,
-                    noise_std,
                     neighbors_batch,
                     unroll_steps,
                 )
-                # unroll for push-forward steps
-                _current_pos = raw_batch[0][:, :, : self.input_seq_length]
-                for _ in range(unroll_steps):
-                    if neighbors_batch.did_buffer_overflow.sum() > 0:
-                        break
-                    _current_pos, neighbors_batch, features_batch = push_forward_vmap(
-                        features_batch,
-                        _current_pos,
-                        raw_batch[1],
-                        neighbors_batch,
-                        params,
-                        state,
-                    )
 
                 if neighbors_batch.did_buffer_overflow.sum() > 0:
                     # check if the neighbor list is too small for any of the samples
@@ -364,23 +535,12 @@ class Trainer:
                     # did_buffer_overflow > 0 we directly return to the beginning
                     continue
                 keys = _keys
-
-                loss, params, state, opt_state = update_fn(
-                    params=params,
-                    state=state,
-                    features_batch=features_batch,
-                    target_batch=target_batch,
-                    particle_type_batch=raw_batch[1],
-                    opt_state=opt_state,
-                )
+                params, state, opt_state = new_params, new_state, new_opt_state
 
                 if step % cfg_logging.log_steps == 0:
-                    loss.block_until_ready()
-                    if cfg_logging.wandb:
-                        wandb_run.log({"train/loss": loss.item()}, step)
-                    else:
-                        step_str = str(step).zfill(len(str(int(step_max))))
-                        print(f"{step_str}, train/loss: {loss.item():.5f}.")
+                    if pending_log is not None:
+                        log_loss(*pending_log)
+                    pending_log = (step, loss)
 
                 if step % cfg_logging.eval_steps == 0 and step > 0:
                     nbrs = broadcast_from_batch(neighbors_batch, index=0)
@@ -415,6 +575,9 @@ class Trainer:
                 if step == step_max + 1:
                     break
 
+        if pending_log is not None:
+            log_loss(*pending_log)
+
         if cfg_logging.wandb:
             wandb_run.finish()
 
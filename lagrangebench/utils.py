@@ -38,13 +38,17 @@ def get_kinematic_mask(particle_type):
 def broadcast_to_batch(sample, batch_size: int):
     """Broadcast a pytree to a batched one with first dimension batch_size."""
     assert batch_size > 0
-    return jax.tree_map(lambda x: jnp.repeat(x[None, ...], batch_size, axis=0), sample)
+    # broadcast_to tiles lazily (no copy until XLA materializes it), unlike the
+    # jnp.repeat this replaces, which allocated batch_size copies eagerly
+    return jax.tree_util.tree_map(
+        lambda x: jnp.broadcast_to(x[None, ...], (batch_size, *x.shape)), sample
+    )
 
 
 def broadcast_from_batch(batch, index: int):
     """Broadcast a batched pytree to the sample `index` out of the batch."""
     assert index >= 0
-    return jax.tree_map(lambda x: x[index], batch)
+    return jax.tree_util.tree_map(lambda x: x[index], batch)
 
 
 def save_pytree(ckp_dir: str, pytree_obj, name) -> None:
@@ -53,7 +57,7 @@ def save_pytree(ckp_dir: str, pytree_obj, name) -> None:
         for x in jax.tree_leaves(pytree_obj):
             np.save(f, x, allow_pickle=False)
 
-    tree_struct = jax.tree_map(lambda t: 0, pytree_obj)
+    tree_struct = jax.tree_util.tree_map(lambda t: 0, pytree_obj)
     with open(os.path.join(ckp_dir, f"{name}_tree.pkl"), "wb") as f:
         pickle.dump(tree_struct, f)
 
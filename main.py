@@ -1,4 +1,5 @@
 import os
+import sys
 
 from omegaconf import DictConfig, OmegaConf
 
@@ -56,6 +57,10 @@ if __name__ == "__main__":
     cli_args.gpu = cli_args.get("gpu", -1)
     cli_args.xla_mem_fraction = cli_args.get("xla_mem_fraction", 0.75)
 
+    # the device/memory env vars below are only picked up if jax has not been
+    # initialized yet; fail loudly if an import above ever starts pulling it in
+    assert "jax" not in sys.modules, "jax must be imported after setting env vars."
+
     # specify cuda device
     os.environ["CUDA_DEVICE_ORDER"] = "PCI_BUS_ID"  # see issue #152 from TensorFlow
     os.environ["CUDA_VISIBLE_DEVICES"] = str(cli_args.gpu)
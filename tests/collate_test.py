@@ -0,0 +1,70 @@
+import unittest
+
+import numpy as np
+
+from lagrangebench.data.utils import BufferPoolCollate, numpy_collate
+
+
+class TestBufferPoolCollate(unittest.TestCase):
+    """Class for unit testing the buffer-pool collate function."""
+
+    def _make_batch(self, seed):
+        rng = np.random.default_rng(seed)
+        positions = [rng.random((5, 4, 2)).astype(np.float32) for _ in range(3)]
+        particle_types = [np.full(5, i, dtype=np.int64) for i in range(3)]
+        return list(zip(positions, particle_types))
+
+    def test_matches_numpy_collate(self):
+        batch = self._make_batch(0)
+        collate = BufferPoolCollate(pool_size=2)
+
+        out = collate(batch)
+        ref = numpy_collate(batch)
+
+        self.assertEqual(type(out), type(ref))
+        for out_i, ref_i in zip(out, ref):
+            self.assertEqual(out_i.shape, ref_i.shape)
+            self.assertEqual(out_i.dtype, ref_i.dtype)
+            self.assertTrue((out_i == ref_i).all())
+
+    def test_in_flight_batches_stay_intact(self):
+        # a dataloader worker with prefetch_factor=f can hold up to f batches
+        # that are returned but not yet serialized by the feeder thread. With
+        # pool_size = f + 1, all of them must survive the next collate call.
+        prefetch_factor = 3
+        collate = BufferPoolCollate(pool_size=prefetch_factor + 1)
+
+        in_flight = []
+        for seed in range(3 * prefetch_factor):
+            batch = self._make_batch(seed)
+            in_flight.append((collate(batch), numpy_collate(batch)))
+            # only the most recent prefetch_factor batches are in flight
+            in_flight = in_flight[-prefetch_factor:]
+
+            for out, ref in in_flight:
+                for out_i, ref_i in zip(out, ref):
+                    self.assertTrue(
+                        (out_i == ref_i).all(),
+                        "In-flight batch was overwritten by a later collate",
+                    )
+
+    def test_buffers_are_reused(self):
+        pool_size = 2
+        collate = BufferPoolCollate(pool_size=pool_size)
+
+        outputs = [collate(self._make_batch(seed)) for seed in range(pool_size + 1)]
+        # after pool_size calls the pool wraps around to the first buffer
+        self.assertTrue(np.shares_memory(outputs[0][0], outputs[pool_size][0]))
+        self.assertFalse(np.shares_memory(outputs[0][0], outputs[1][0]))
+
+    def test_single_sample_batch_is_view(self):
+        collate = BufferPoolCollate(pool_size=2)
+        batch = self._make_batch(0)[:1]
+
+        out = collate(batch)
+        self.assertEqual(out[0].shape, (1, *batch[0][0].shape))
+        self.assertTrue(np.shares_memory(out[0], batch[0][0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
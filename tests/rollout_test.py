@@ -1,5 +1,4 @@
 import unittest
-from functools import partial
 
 import haiku as hk
 import jax
@@ -17,7 +16,7 @@ from lagrangebench.case_setup import case_builder
 from lagrangebench.data import H5Dataset
 from lagrangebench.data.utils import get_dataset_stats, numpy_collate
 from lagrangebench.evaluate import MetricsComputer
-from lagrangebench.evaluate.rollout import _eval_batched_rollout, _forward_eval
+from lagrangebench.evaluate.rollout import _eval_batched_rollout
 from lagrangebench.utils import broadcast_from_batch
 
 
@@ -136,20 +135,12 @@ class TestInferBuilder(unittest.TestCase):
             isl,
         )
 
-        forward_eval = partial(
-            _forward_eval,
-            model_apply=model_apply,
-            case_integrate=self.case.integrate,
-        )
-        forward_eval_vmap = vmap(forward_eval, in_axes=(None, None, 0, 0, 0))
-        preprocess_eval_vmap = vmap(self.case.preprocess_eval, in_axes=(0, 0))
         metrics_computer_vmap = vmap(metrics_computer, in_axes=(0, 0))
 
         for n_extrap_steps in [0, 5, 10]:
             with self.subTest(n_extrap_steps):
                 example_rollout_batch, metrics_batch, neighbors = _eval_batched_rollout(
-                    forward_eval_vmap=forward_eval_vmap,
-                    preprocess_eval_vmap=preprocess_eval_vmap,
+                    model_apply=model_apply,
                     case=self.case,
                     params=params,
                     state=state,